@@ -1,6 +1,9 @@
 import os
 import json
+import re
 import time
+import functools
+import orjson
 import streamlit as st
 import tiktoken
 from dotenv import load_dotenv
@@ -8,6 +11,9 @@ from dotenv import load_dotenv
 # LangChain imports
 from langchain_community.graphs import Neo4jGraph
 from langchain.chains import GraphCypherQAChain
+from langchain.globals import set_llm_cache
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_community.cache import SQLiteCache
 from langchain_community.llms.sagemaker_endpoint import SagemakerEndpoint, LLMContentHandler
 
 # Load environment variables
@@ -26,6 +32,37 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 # --- FinOps/LLMOps Configuration ---
 INPUT_TOKEN_COST = 0.0002 / 1000  # Mock cost for 1K input tokens
 OUTPUT_TOKEN_COST = 0.0008 / 1000 # Mock cost for 1K output tokens
+FAST_TOKEN_COUNT = True  # Estimate ~4 characters per token instead of running tiktoken; set False for exact counts
+
+# --- Response Cache Configuration ---
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # Seconds an exact-match answer stays cached
+LLM_CACHE_PATH = ".langchain.db"  # SQLite cache for identical LLM prompts (Cypher generation + answers)
+GRAPH_VERSION_TTL = 60  # Seconds between checks for a newer ingest; a change invalidates cached answers
+INGEST_VERSION_QUERY = "MATCH (r:IngestRun {id: 'latest'}) RETURN r.version AS version"
+
+# Hand-trimmed schema sent to the Cypher LLM; only the labels and relationships in the PLM dataset
+GRAPH_SCHEMA = (
+    "Node labels: Part(part_id,name), Supplier(supplier_id,name,region), "
+    "ProductLine(name), ComplianceDoc(doc_id,status,standard)\n"
+    "Relationships: (ProductLine)-[:CONTAINS_PART]->(Part), (Part)-[:SUPPLIED_BY]->(Supplier), "
+    "(Part)-[:HAS_COMPLIANCE]->(ComplianceDoc)"
+)
+
+# Example questions - Use this first to show the update of data in the database
+# example_questions = [
+#     "Which parts are supplied by companies in Germany?",
+#     "List all suppliers for the 'E-Bike Model X' product line.",
+#     "What is the compliance status for the part 'Control Unit'?",
+#     "Which supplier provides the 'Main Frame'?",
+#     "Show me all parts that have failed a REACH compliance standard."
+# ]
+example_questions = [
+    "Which supplier provides the 'Carbon Fiber Frame Assembly'?",
+    "List all suppliers from the region Germany.",
+    "What is the compliance status for the part 'Guidance System'?",
+    "Show me all parts that have failed a RoHS compliance standard.",
+    "Which region is 'Helios Energy' from?"
+]
 
 # Content handler for Mistral 7B models on SageMaker
 class ContentHandler(LLMContentHandler):
@@ -35,32 +72,51 @@ class ContentHandler(LLMContentHandler):
     def transform_input(self, prompt: str, model_kwargs: dict) -> bytes:
         # Add instruction formatting for Mistral
         formatted_prompt = f"<s>[INST] {prompt} [/INST]"
-        input_str = json.dumps(
+        # orjson serializes straight to UTF-8 bytes
+        return orjson.dumps(
             {"inputs": formatted_prompt, "parameters": {**model_kwargs}}
         )
-        return input_str.encode("utf-8")
 
     def transform_output(self, output: bytes) -> str:
-        response_json = json.loads(output.read().decode("utf-8"))
-        
-        print("Raw LLM Response:", response_json) # Good for debugging
+        response_json = orjson.loads(output.read())
         return response_json["generated_text"]
-        # ----------------------
+
 # Initialize the token counter
-tokenizer = tiktoken.get_encoding("cl100k_base")
+@st.cache_resource
+def get_tokenizer():
+    """Load the cl100k_base encoding once per process instead of on every script rerun."""
+    return tiktoken.get_encoding("cl100k_base")
+
+@st.cache_resource
+def get_token_counter():
+    """Return a memoized token counter that survives Streamlit script reruns."""
+    @functools.lru_cache(maxsize=2048)
+    def _token_lens(*texts: str) -> tuple:
+        if FAST_TOKEN_COUNT:
+            # Counts only feed the cost display, so a character heuristic is enough
+            return tuple(max(1, len(text) // 4) for text in texts)
+        # One encode_batch call tokenizes every text in parallel native threads
+        encoded = get_tokenizer().encode_batch(list(texts), num_threads=len(texts))
+        return tuple(len(tokens) for tokens in encoded)
+    return _token_lens
+
+def read_ingest_version(graph) -> str:
+    """Return the version stamped on the graph by the last completed ingest_data.py run."""
+    records = graph.query(INGEST_VERSION_QUERY)
+    return records[0]["version"] if records else "none"
 
 @st.cache_resource
 def initialize_components():
     """Initialize and cache the Neo4j graph and the LangChain QA chain."""
-    # Initialize Neo4j Graph
+    # Reuse completions for prompts the LLM has already answered
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
+    # Initialize Neo4j Graph. The Cypher prompt uses the fixed GRAPH_SCHEMA, so skip
+    # the schema introspection (several meta queries) on every cold start.
     graph = Neo4jGraph(
-        url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD
+        url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD, refresh_schema=False
     )
 
-    # Force the graph object to refresh its schema information.
-    # This ensures the LLM has the most accurate view of the database.
-    graph.refresh_schema()
-
     # Initialize SageMaker LLM
     content_handler = ContentHandler()
     llm = SagemakerEndpoint(
@@ -72,10 +128,23 @@ def initialize_components():
     
     # Initialize the GraphCypherQAChain
     chain = GraphCypherQAChain.from_llm(
-        graph=graph, llm=llm, verbose=True, return_intermediate_steps=True
+        graph=graph, llm=llm, verbose=False, return_intermediate_steps=True
     )
+    # from_llm freezes the (here empty) introspected schema into the Cypher prompt; use the compact PLM schema
+    chain.graph_schema = GRAPH_SCHEMA
     return chain
 
+# Filler words that never change what a question asks for
+QUESTION_STOPWORDS = {"a", "an", "the", "is", "are", "please", "me", "show", "list", "give", "tell"}
+QUOTED_LITERAL = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+def question_key(question: str) -> tuple:
+    """Normalize a question into its quoted literals and sorted key terms for cache lookups."""
+    # Quoted names are matched verbatim by the generated Cypher, so they stay case-sensitive
+    literals = tuple(single or double for single, double in QUOTED_LITERAL.findall(question))
+    words = re.findall(r"[a-z0-9]+", QUOTED_LITERAL.sub(" ", question).lower())
+    return literals, tuple(sorted(word for word in words if word not in QUESTION_STOPWORDS))
+
 # --- Streamlit UI ---
 st.set_page_config(page_title="PLM Co-Pilot 🏭", layout="wide")
 st.title("🔩 Product Lifecycle Management (PLM) Co-Pilot")
@@ -88,21 +157,72 @@ except Exception as e:
     st.error(f"Failed to initialize components. Please check your .env file and connections. Error: {e}")
     st.stop()
 
-# Example questions - Use this first to show the update of data in the database
-# example_questions = [
-#     "Which parts are supplied by companies in Germany?",
-#     "List all suppliers for the 'E-Bike Model X' product line.",
-#     "What is the compliance status for the part 'Control Unit'?",
-#     "Which supplier provides the 'Main Frame'?",
-#     "Show me all parts that have failed a REACH compliance standard."
-# ]
-example_questions = [
-    "Which supplier provides the 'Carbon Fiber Frame Assembly'?",
-    "List all suppliers from the region Germany.",
-    "What is the compliance status for the part 'Guidance System'?",
-    "Show me all parts that have failed a RoHS compliance standard.",
-    "Which region is 'Helios Energy' from?"
-]
+@st.cache_resource
+def last_graph_version() -> dict:
+    """Hold the last ingest version read successfully, shared across sessions."""
+    return {"version": None}
+
+@st.cache_data(ttl=GRAPH_VERSION_TTL, show_spinner=False)
+def get_graph_version():
+    """Return the version stamped by the last completed ingest, re-read at most once a minute."""
+    known = last_graph_version()
+    try:
+        known["version"] = read_ingest_version(qa_chain.graph)
+    except Exception:
+        # A failed read keeps the last known version rather than invalidating every cached answer
+        pass
+    return known["version"]
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Count prompts actually sent to the LLM; prompts answered by the LLM cache never fire on_llm_start."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += len(prompts)
+
+def invoke_chain(question: str) -> tuple:
+    """Run the QA chain; return (result, number of prompts sent to the LLM)."""
+    counter = LLMCallCounter()
+    result = qa_chain.invoke({"query": question}, config={"callbacks": [counter]})
+    return result, counter.calls
+
+@st.cache_data(ttl=RESPONSE_CACHE_TTL, show_spinner=False)
+def cached_invoke(key: tuple, graph_version: str, _question: str, _llm_calls: list) -> dict:
+    """Run the QA chain, caching the result per normalized question and ingest version."""
+    # Only runs on a cache miss; underscored arguments are left out of the cache key
+    result, calls = invoke_chain(_question)
+    _llm_calls.append(calls)
+    return result
+
+@st.cache_resource(ttl=RESPONSE_CACHE_TTL, show_spinner="Precomputing example answers...")
+def warm_example_answers(graph_version: str) -> list:
+    """Run the example questions through the response cache once; return the ones that succeeded."""
+    warmed = []
+    for question in example_questions:
+        try:
+            cached_invoke(question_key(question), graph_version, question, [])
+            warmed.append(question)
+        except Exception:
+            # An unreachable endpoint just leaves that example to be answered on click
+            continue
+    return warmed
+
+def answer_question(question: str) -> tuple:
+    """Answer through the response and LLM caches; return (result, number of prompts sent to the LLM)."""
+    if graph_version is None:
+        # No ingest version read yet, so there is nothing safe to key cached answers on
+        return invoke_chain(question)
+    llm_calls = []
+    result = cached_invoke(question_key(question), graph_version, question, llm_calls)
+    return result, sum(llm_calls)
+
+# A new ingest changes the response-cache key, so stale answers are never reused
+graph_version = get_graph_version()
+if graph_version is not None:
+    warm_example_answers(graph_version)
+
 st.subheader("Example Questions:")
 cols = st.columns(len(example_questions))
 for i, question in enumerate(example_questions):
@@ -129,11 +249,8 @@ if st.button("Ask Co-Pilot") and user_question:
         # --- LLMOps & FinOps Instrumentation ---
         start_time = time.perf_counter()
         
-        # Token calculation
-        prompt_tokens = len(tokenizer.encode(user_question))
-
-        # Invoke the chain
-        result = qa_chain.invoke({"query": user_question})
+        # Invoke the chain (through the response caches)
+        result, llm_calls = answer_question(user_question)
         
         # Stop timer
         end_time = time.perf_counter()
@@ -142,12 +259,20 @@ if st.button("Ask Co-Pilot") and user_question:
         # Extract results
         answer = result.get("result", "Sorry, I couldn't find an answer.")
         cypher_query = result.get("intermediate_steps", [{}])[0].get("query", "No Cypher query generated.")
+        graph_context = next(
+            (step["context"] for step in result.get("intermediate_steps", []) if "context" in step), []
+        )
 
-        completion_tokens = len(tokenizer.encode(answer))
+        # Token calculation (kept outside the timed section)
+        token_lens = get_token_counter()
+        prompt_tokens, completion_tokens = token_lens(user_question, answer)
         total_tokens = prompt_tokens + completion_tokens
 
-        # Cost calculation
-        cost = (prompt_tokens * INPUT_TOKEN_COST) + (completion_tokens * OUTPUT_TOKEN_COST)
+        # Cost calculation (an answer served entirely from the caches made no LLM call)
+        if llm_calls == 0:
+            cost = 0.0
+        else:
+            cost = (prompt_tokens * INPUT_TOKEN_COST) + (completion_tokens * OUTPUT_TOKEN_COST)
 
         # --- Display Results ---
         st.subheader("Answer:")
@@ -156,6 +281,9 @@ if st.button("Ask Co-Pilot") and user_question:
         with st.expander("Show Accountability & Metrics 📊"):
             st.subheader("Generated Cypher Query:")
             st.code(cypher_query, language="cypher")
+
+            st.subheader("Retrieved Graph Context:")
+            st.json(graph_context)
             
             st.subheader("Performance & Cost:")
             col1, col2, col3 = st.columns(3)
@@ -163,6 +291,13 @@ if st.button("Ask Co-Pilot") and user_question:
                 st.metric(label="End-to-End Latency", value=f"{latency:.2f}s")
             with col2:
                 st.metric(label="Total Tokens", value=f"{total_tokens}")
-                st.caption(f"Prompt: {prompt_tokens}, Completion: {completion_tokens}")
+                st.caption(
+                    f"Prompt: {prompt_tokens}, Completion: {completion_tokens}"
+                    + (" (estimated)" if FAST_TOKEN_COUNT else "")
+                )
             with col3:
-                st.metric(label="Estimated Cost", value=f"${cost:.6f}")
\ No newline at end of file
+                st.metric(label="Estimated Cost", value=f"${cost:.6f}")
+                if llm_calls == 0:
+                    st.caption("Served from cache, no LLM call")
+                else:
+                    st.caption("Upper bound; prompts reused from the LLM cache are not billed")
\ No newline at end of file
@@ -1,6 +1,9 @@
 import os
-import pandas as pd
-from neo4j import GraphDatabase
+import asyncio
+import uuid
+from itertools import zip_longest
+import pyarrow.csv as pacsv
+from neo4j import AsyncGraphDatabase
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,6 +13,8 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+# Naming the database up front saves the driver a home-database lookup per call
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
 
 # --- CORRECTED FILE PATHS ---
 # Pointing to the large dataset in the 'mock_data' folder
@@ -18,26 +23,111 @@ SUPPLIERS_CSV = os.path.join('mock_data', 'suppliers.csv')
 SUPPLY_CHAIN_CSV = os.path.join('mock_data', 'supply_chain.csv')
 COMPLIANCE_CSV = os.path.join('mock_data', 'compliance.csv')
 
+# Optional base URL (e.g. "file:///" or an HTTPS folder) the Neo4j server can read the CSVs from.
+# When set, rows are streamed server-side with LOAD CSV instead of being sent through Python.
+NEO4J_CSV_URL = os.getenv("NEO4J_CSV_URL")
+
+# Rows sent per UNWIND transaction; keeps each commit bounded on large datasets
+BATCH_SIZE = 10000
+
+
+# Per-row Cypher, fed either by UNWIND $rows (Python path) or by LOAD CSV (server path)
+PARTS_QUERY = """
+MERGE (p:Part {part_id: row.part_id})
+SET p.name = row.part_name
+MERGE (pl:ProductLine {name: row.product_line})
+// --- THE ESSENTIAL FIX ---
+MERGE (pl)-[:CONTAINS_PART]->(p)
+"""
+SUPPLIERS_QUERY = """
+MERGE (s:Supplier {supplier_id: row.supplier_id})
+SET s.name = row.supplier_name, s.region = row.region
+"""
+SUPPLY_CHAIN_QUERY = """
+MATCH (p:Part {part_id: row.part_id})
+MATCH (s:Supplier {supplier_id: row.supplier_id})
+MERGE (p)-[:SUPPLIED_BY]->(s)
+"""
+COMPLIANCE_QUERY = """
+MATCH (p:Part {part_id: row.part_id})
+MERGE (d:ComplianceDoc {doc_id: row.doc_id})
+SET d.status = row.status, d.standard = row.standard
+MERGE (p)-[:HAS_COMPLIANCE]->(d)
+"""
+
+
+async def _write_statements(tx, statements):
+    # statements are (query, params) pairs; params may be None
+    for query, params in statements:
+        result = await tx.run(query, params)
+        await result.consume()
+
+
+async def _pipeline_write(driver, steps, size=BATCH_SIZE):
+    # Zip the CSVs of one phase into superbatches so each transaction carries every statement.
+    # The statements run back to back in that transaction: fewer commits, no concurrency.
+    queries = [f"UNWIND $rows AS row\n{row_query}" for row_query, _ in steps]
+    tables = await asyncio.gather(*(asyncio.to_thread(pacsv.read_csv, path) for _, path in steps))
+    async with driver.session(database=NEO4J_DATABASE) as session:
+        for batches in zip_longest(*(table.to_batches(max_chunksize=size) for table in tables)):
+            statements = [
+                (query, {'rows': batch.to_pylist()}) for query, batch in zip(queries, batches) if batch is not None
+            ]
+            await session.execute_write(_write_statements, statements)
+
+
+async def _load_csv(driver, row_query, csv_path, size=BATCH_SIZE):
+    base_url = NEO4J_CSV_URL if NEO4J_CSV_URL.endswith('/') else NEO4J_CSV_URL + '/'
+    query = (
+        f"LOAD CSV WITH HEADERS FROM $url AS row\n"
+        f"CALL {{\nWITH row\n{row_query}\n}} IN TRANSACTIONS OF {size} ROWS"
+    )
+    # CALL { ... } IN TRANSACTIONS only runs in an auto-commit transaction, hence session.run
+    async with driver.session(database=NEO4J_DATABASE) as session:
+        result = await session.run(query, url=base_url + os.path.basename(csv_path))
+        await result.consume()
+
+
+async def _ingest_phase(driver, steps, disjoint=False):
+    if NEO4J_CSV_URL:
+        # Auto-commit LOAD CSV gets no driver retry, so only steps touching disjoint nodes run concurrently
+        if disjoint:
+            await asyncio.gather(*(_load_csv(driver, row_query, path) for row_query, path in steps))
+        else:
+            for row_query, path in steps:
+                await _load_csv(driver, row_query, path)
+    else:
+        await _pipeline_write(driver, steps)
+
 
 class Neo4jIngestor:
     def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
+
+    async def close(self):
+        await self.driver.close()
 
-    def close(self):
-        self.driver.close()
+    async def run_query(self, query, **params):
+        # Parameters arrive as keywords, e.g. run_query(query, rows=records)
+        result = await self.driver.execute_query(query, parameters_=params, database_=NEO4J_DATABASE)
+        return result.records
 
-    def run_query(self, query, params={}):
-        with self.driver.session() as session:
-            result = session.run(query, params)
-            return [record for record in result]
+    async def run_in_transaction(self, queries):
+        # Idempotent schema statements can share one transaction: one commit instead of one per query
+        async with self.driver.session(database=NEO4J_DATABASE) as session:
+            await session.execute_write(_write_statements, [(query, None) for query in queries])
 
-    def clear_database(self):
+    async def clear_database(self):
         print("Clearing existing data from the database...")
-        query = "MATCH (n) DETACH DELETE n"
-        self.run_query(query)
+        # Delete in bounded batches so the server never holds the whole delete set in one transaction
+        query = f"MATCH (n) CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF {BATCH_SIZE} ROWS"
+        # CALL { ... } IN TRANSACTIONS only runs in an auto-commit transaction, hence session.run
+        async with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = await session.run(query)
+            await result.consume()
         print("Database cleared.")
 
-    def create_constraints(self):
+    async def create_constraints(self):
         print("Creating constraints for faster lookups...")
         queries = [
             "CREATE CONSTRAINT IF NOT EXISTS FOR (p:Part) REQUIRE p.part_id IS UNIQUE",
@@ -45,69 +135,57 @@ class Neo4jIngestor:
             "CREATE CONSTRAINT IF NOT EXISTS FOR (pl:ProductLine) REQUIRE pl.name IS UNIQUE",
             "CREATE CONSTRAINT IF NOT EXISTS FOR (d:ComplianceDoc) REQUIRE d.doc_id IS UNIQUE",
         ]
-        for query in queries:
-            self.run_query(query)
+        await self.run_in_transaction(queries)
         print("Constraints created.")
 
-    def ingest_data(self):
-        # Verify that the data files exist before proceeding
-        for f in [PARTS_CSV, SUPPLIERS_CSV, SUPPLY_CHAIN_CSV, COMPLIANCE_CSV]:
-            if not os.path.exists(f):
-                print(f"Error: Data file not found at {f}. Please ensure your large dataset is in the 'mock_data' folder.")
-                return
-
-        self.clear_database()
-        self.create_constraints()
-
-        # Ingest Parts and Product Lines
-        print("Ingesting Parts and Product Lines with corrected relationship...")
-        parts_df = pd.read_csv(PARTS_CSV)
-        parts_query = """
-        UNWIND $rows AS row
-        MERGE (p:Part {part_id: row.part_id})
-        SET p.name = row.part_name
-        MERGE (pl:ProductLine {name: row.product_line})
-        // --- THE ESSENTIAL FIX ---
-        MERGE (pl)-[:CONTAINS_PART]->(p)
-        """
-        self.run_query(parts_query, params={'rows': parts_df.to_dict('records')})
-
-        # Ingest Suppliers
-        print("Ingesting Suppliers...")
-        suppliers_df = pd.read_csv(SUPPLIERS_CSV)
-        suppliers_query = """
-        UNWIND $rows AS row
-        MERGE (s:Supplier {supplier_id: row.supplier_id})
-        SET s.name = row.supplier_name, s.region = row.region
-        """
-        self.run_query(suppliers_query, params={'rows': suppliers_df.to_dict('records')})
-
-        # Ingest Supply Chain Relationships
-        print("Ingesting Supply Chain relationships...")
-        supply_chain_df = pd.read_csv(SUPPLY_CHAIN_CSV)
-        supply_chain_query = """
-        UNWIND $rows AS row
-        MATCH (p:Part {part_id: row.part_id})
-        MATCH (s:Supplier {supplier_id: row.supplier_id})
-        MERGE (p)-[:SUPPLIED_BY]->(s)
-        """
-        self.run_query(supply_chain_query, params={'rows': supply_chain_df.to_dict('records')})
-        
-        # Ingest Compliance Documents
-        print("Ingesting Compliance data...")
-        compliance_df = pd.read_csv(COMPLIANCE_CSV)
-        compliance_query = """
-        UNWIND $rows AS row
-        MATCH (p:Part {part_id: row.part_id})
-        MERGE (d:ComplianceDoc {doc_id: row.doc_id})
-        SET d.status = row.status, d.standard = row.standard
-        MERGE (p)-[:HAS_COMPLIANCE]->(d)
-        """
-        self.run_query(compliance_query, params={'rows': compliance_df.to_dict('records')})
+    async def create_indexes(self):
+        print("Creating indexes on properties used in question lookups...")
+        queries = [
+            "CREATE INDEX part_name_idx IF NOT EXISTS FOR (p:Part) ON (p.name)",
+            "CREATE INDEX supplier_name_idx IF NOT EXISTS FOR (s:Supplier) ON (s.name)",
+            "CREATE INDEX supplier_region_idx IF NOT EXISTS FOR (s:Supplier) ON (s.region)",
+            "CREATE INDEX compliance_standard_idx IF NOT EXISTS FOR (d:ComplianceDoc) ON (d.standard)",
+        ]
+        await self.run_in_transaction(queries)
+        print("Indexes created.")
+
+    async def ingest_data(self):
+        # Verify that the data files exist before proceeding (LOAD CSV reads them server-side)
+        if not NEO4J_CSV_URL:
+            for f in [PARTS_CSV, SUPPLIERS_CSV, SUPPLY_CHAIN_CSV, COMPLIANCE_CSV]:
+                if not os.path.exists(f):
+                    print(f"Error: Data file not found at {f}. Please ensure your large dataset is in the 'mock_data' folder.")
+                    return
+
+        # Fail fast on bad credentials or an unreachable instance
+        await self.driver.verify_connectivity()
+
+        await self.clear_database()
+        await self.create_constraints()
+        await self.create_indexes()
+
+        # Parts and Suppliers are independent node sets, so they load together (sharing each
+        # superbatch transaction, or as concurrent LOAD CSV statements); the relationship
+        # ingests MATCH on those nodes and must wait for both.
+        print("Ingesting Parts, Product Lines and Suppliers...")
+        await _ingest_phase(self.driver, [(PARTS_QUERY, PARTS_CSV), (SUPPLIERS_QUERY, SUPPLIERS_CSV)], disjoint=True)
+
+        print("Ingesting Supply Chain relationships and Compliance data...")
+        await _ingest_phase(self.driver, [(SUPPLY_CHAIN_QUERY, SUPPLY_CHAIN_CSV), (COMPLIANCE_QUERY, COMPLIANCE_CSV)])
+
+        # Stamp this ingest so the app can tell its cached answers are stale
+        await self.run_query(
+            "MERGE (r:IngestRun {id: 'latest'}) SET r.version = $version, r.completed_at = datetime()",
+            version=uuid.uuid4().hex,
+        )
 
         print("\nLarge dataset ingestion complete with corrected schema! ✨")
 
-if __name__ == "__main__":
+
+async def main():
     ingestor = Neo4jIngestor(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
-    ingestor.ingest_data()
-    ingestor.close()
\ No newline at end of file
+    await ingestor.ingest_data()
+    await ingestor.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file